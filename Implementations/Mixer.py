@@ -1,12 +1,38 @@
 import random
+import sys
 import time
 import hashlib
 import itertools
+import math
+from collections import Counter
+
+# Bound once at import time; the hashes only derive simulated addresses and IDs, not security material.
+_sha256 = hashlib.sha256
+
+# Numbers every transaction created in this process, so that transaction IDs stay unique even when two
+# transactions share the same addresses, amount and timestamp.
+_transaction_sequence = itertools.count()
+
+# Search budget for the privacy analysis. The number of possible sender/receiver assignments grows
+# exponentially with the number of transactions, so the analysis is skipped with a warning when:
+# - an up-front count of the candidate scenarios, made before any search, exceeds MAX_CANDIDATE_SCENARIOS;
+# - the solver would store more than MAX_SEARCH_STEPS predecessor steps, which also bounds its states; or
+# - more than MAX_SCENARIOS matching scenarios would have to be listed.
+# Together these keep the time and memory of a skipped analysis to a few seconds and tens of MB.
+MAX_CANDIDATE_SCENARIOS = 10 ** 12
+MAX_SEARCH_STEPS = 200_000
+MAX_SCENARIOS = 20_000
+# Number of scenarios whose report lines are buffered before they are written out
+REPORT_BATCH_SCENARIOS = 1_000
 
 class User:
     """Represents a user in the Bitcoin simulation."""
+    __slots__ = ('name', '_name_bytes', 'wallet')
+
     def __init__(self, name):
         self.name = name
+        # Encoded once here so the wallet can derive its address without re-encoding the name
+        self._name_bytes = name.encode()
         self.wallet = Wallet(self)
 
     def __repr__(self):
@@ -14,10 +40,12 @@ class User:
 
 class Wallet:
     """Represents a user's wallet with a public address and balance."""
+    __slots__ = ('owner', 'address', 'balance')
+
     def __init__(self, owner):
         self.owner = owner
         # Generate a simple pseudo-public address from the owner's name
-        self.address = '1x' + hashlib.sha256(owner.name.encode()).hexdigest()[:10]
+        self.address = '1x' + _sha256(owner._name_bytes, usedforsecurity=False).hexdigest()[:10]
         self.balance = 100.0  # Initial balance for simulation purposes
 
     def __repr__(self):
@@ -25,16 +53,23 @@ class Wallet:
 
 class Transaction:
     """Represents a single transaction between a sender and a receiver."""
+    __slots__ = ('sender_address', 'receiver_address', 'amount', 'timestamp', 'transaction_id', 'sender_wallet')
+
     def __init__(self, sender_wallet, receiver_address, amount):
         self.sender_address = sender_wallet.address
         self.receiver_address = receiver_address
         self.amount = amount
-        self.timestamp = time.time()
+        # Monotonic integer nanoseconds with no defined starting point, so this is not a wall-clock time.
+        # It never goes backwards, but two transactions can still read the same value; it only feeds the
+        # transaction ID, and an int formats into the hash input more cheaply than a float.
+        self.timestamp = time.perf_counter_ns()
         # Create a unique string based on transaction data BEFORE creating the ID.
         # This resolves the AttributeError caused by a circular dependency where __init__ called __repr__
         # before the transaction_id was created.
-        transaction_data_string = f"{self.sender_address}{self.receiver_address}{self.amount}{self.timestamp}"
-        self.transaction_id = hashlib.sha256(transaction_data_string.encode()).hexdigest()
+        # The sequence number keeps the ID unique when the other fields repeat.
+        transaction_data_string = (f"{self.sender_address}{self.receiver_address}{self.amount}{self.timestamp}"
+                                   f"{next(_transaction_sequence)}")
+        self.transaction_id = _sha256(transaction_data_string.encode(), usedforsecurity=False).hexdigest()
 
     def __repr__(self):
         return (f"Transaction({self.transaction_id[:6]}...): "
@@ -58,11 +93,19 @@ class Mixer:
         transaction.sender_wallet.balance -= transaction.amount
         print(f"[Wallet] {transaction.sender_wallet.owner.name}'s balance updated: {transaction.sender_wallet.balance:.2f} BTC")
 
-    def mix_and_send(self, all_wallets):
-        """Mixes and sends the funds from the pool to the intended recipients."""
-        print("\n[Mixer] Starting mixing process...")
+    def mix_and_send(self, all_wallets, simulate_delay=False):
+        """
+        Mixes and sends the funds from the pool to the intended recipients.
+        Pass simulate_delay=True to pause for a second, as a real mixer would before paying out.
+        """
+        # Collect the progress messages and write them out in one go at the end
+        log = ["\n[Mixer] Starting mixing process..."]
         random.shuffle(self.pending_transactions)
-        time.sleep(1) # Simulate the time delay in mixing
+        if simulate_delay:
+            time.sleep(1) # Simulate the time delay in mixing
+
+        # Index the wallets by address once so each recipient lookup is a single dict access
+        wallet_by_address = {w.address: w for w in all_wallets}
 
         for tx in self.pending_transactions:
             # The mixer sends the money, not the original user.
@@ -70,16 +113,17 @@ class Mixer:
             mixed_tx = Transaction(self, tx.receiver_address, tx.amount)
 
             # Find the recipient's wallet and update balance
-            recipient_wallet = next((w for w in all_wallets if w.address == tx.receiver_address), None)
+            recipient_wallet = wallet_by_address.get(tx.receiver_address)
             if recipient_wallet:
                 recipient_wallet.balance += tx.amount
                 self.ledger.append(mixed_tx)
-                print(f"[Mixer] Sent {tx.amount} BTC to {tx.receiver_address[:8]}... on behalf of an anonymous user.")
-                print(f"[Wallet] {recipient_wallet.owner.name}'s balance updated: {recipient_wallet.balance:.2f} BTC")
+                log.append(f"[Mixer] Sent {tx.amount} BTC to {tx.receiver_address[:8]}... on behalf of an anonymous user.")
+                log.append(f"[Wallet] {recipient_wallet.owner.name}'s balance updated: {recipient_wallet.balance:.2f} BTC")
             else:
-                print(f"[Mixer] Error: Recipient wallet {tx.receiver_address} not found.")
+                log.append(f"[Mixer] Error: Recipient wallet {tx.receiver_address} not found.")
 
         self.pending_transactions = [] # Clear the pool
+        sys.stdout.write("\n".join(log) + "\n")
         return self.ledger
 
 def main():
@@ -143,55 +187,229 @@ def main():
     final_balances = {u.name: u.wallet.balance for u in users}
     analyze_mixer_privacy(initial_balances, final_balances, tx_amounts, users)
 
-def analyze_mixer_privacy(initial_balances, final_balances, tx_amounts, users):
+def find_solutions_tabled(residual, amounts, amount_ids, remaining_sums, pairs, solutions, tolerances,
+                          max_steps=MAX_SEARCH_STEPS, max_paths=MAX_SCENARIOS):
+    """
+    Finds all sender/receiver assignments for amounts that explain the residual balance changes,
+    adding each one to solutions as a canonical tuple of (sender, receiver, amount_id) entries.
+    Works purely on ints: residual, amounts and remaining_sums are exact integer multiples of a common
+    unit, and user i's balance change counts as explained once it is within tolerances[i] units of zero.
+    Names and real amounts are attached by the caller.
+    amount_ids[i] identifies the value of amounts[i], with equal amounts sharing one id; amounts must be
+    ordered so that equal amounts sit next to each other.
+    pairs lists every allowed (sender, receiver) combination of user positions.
+
+    Different assignment prefixes often leave exactly the same change to explain, so instead of
+    searching every branch separately the residuals reachable after each amount are tabled once,
+    together with pointers to the states they were reached from. Because amount order does not
+    matter, tabling over prefixes of amounts covers every subset of them.
+
+    Returns False, leaving solutions untouched, if more than max_steps predecessor steps would be tabled
+    or more than max_paths paths would have to be walked back to list the solutions.
+    """
+    num_tx = len(amounts)
+    num_steps = 0
+    # Pruning only needs to be safe, so it uses the loosest per-user tolerance and their total
+    max_tolerance = max(tolerances, default=0)
+    total_tolerance = sum(tolerances)
+
+    # layers[i] maps each residual reachable after the first i amounts to the (previous residual,
+    # sender, receiver) steps leading to it. The residuals are exact ints, so equal states always
+    # compare equal and no rounding error builds up from layer to layer.
+    layers = [{tuple(residual): []}]
+    for tx_index in range(num_tx):
+        amount = amounts[tx_index]
+        # Total amount still to be assigned after this transaction
+        remaining = remaining_sums[tx_index + 1]
+        next_layer = {}
+
+        for state in layers[tx_index]:
+            # Iterate through all possible senders and receivers for the current transaction
+            for sender, receiver in pairs:
+                # Create a hypothetical new state: the sender's loss and the receiver's gain
+                # are now accounted for
+                new_residual = list(state)
+                new_residual[sender] += amount
+                new_residual[receiver] -= amount
+
+                # Forward checking: each remaining amount changes a single user's balance by at most
+                # that amount, and the total of all balance changes by at most twice that amount.
+                # Prune the branch if the change left to explain exceeds either bound.
+                left = [abs(x) for x in new_residual]
+                if max(left) > remaining + max_tolerance or sum(left) > 2 * remaining + total_tolerance:
+                    continue
+
+                new_state = tuple(new_residual)
+                steps = next_layer.get(new_state)
+                if steps is None:
+                    next_layer[new_state] = steps = []
+                steps.append((state, sender, receiver))
+                num_steps += 1
+
+            if num_steps > max_steps:
+                return False
+
+        layers.append(next_layer)
+
+    # Count the paths the walk below will follow before starting it: few states can still be joined by
+    # very many paths. path_counts[i] maps each state of layer i to the number of paths reaching it,
+    # split by the pair of the last step while the next amount is equal to it (None otherwise), since
+    # that pair caps which steps the walk may take for the next amount. States no path reaches are left out.
+    path_counts = [{state: {None: 1} for state in layers[0]}]
+    for tx_index in range(num_tx):
+        counts = path_counts[tx_index]
+        amount_id = amount_ids[tx_index]
+        same_as_next = tx_index + 1 < num_tx and amount_ids[tx_index + 1] == amount_id
+        next_counts = {}
+        for state, steps in layers[tx_index + 1].items():
+            by_last = {}
+            for prev_state, sender, receiver in steps:
+                pair = (sender, receiver)
+                num_paths = sum(n for last, n in counts.get(prev_state, {}).items() if last is None or last <= pair)
+                if num_paths:
+                    key = pair if same_as_next else None
+                    by_last[key] = by_last.get(key, 0) + num_paths
+            if by_last:
+                next_counts[state] = by_last
+        path_counts.append(next_counts)
+
+    num_paths = sum(sum(by_last.values()) for state, by_last in path_counts[num_tx].items()
+                    if all(abs(left) <= tolerance for left, tolerance in zip(state, tolerances)))
+    if num_paths > max_paths:
+        return False
+
+    # Holds one (sender, receiver, amount_id) slot per transaction and is overwritten in place
+    path_buf = [None] * num_tx
+
+    # Follow the predecessor pointers back from every state that explains all balance changes, using an
+    # explicit stack instead of recursion. Each entry carries the step that fills path_buf[tx_index];
+    # entries are popped depth-first, so the later slots still hold the steps of the entry's ancestors.
+    # Swapping the pairs of two equal amounts gives the same scenario, so within a run of equal amounts
+    # only paths whose (sender, receiver) pairs never decrease are followed. Every scenario is then
+    # reached exactly once and the buffer, ordered by amount position, is already its canonical key.
+    # Steps are only taken towards states that path_counts shows are still reachable under that rule,
+    # so the walk never explores a dead end and its work is bounded by the path count checked above.
+    stack = []
+    for state in layers[num_tx]:
+        # Check if the assignments explain every user's balance change
+        if all(abs(left) <= tolerance for left, tolerance in zip(state, tolerances)):
+            stack.append((num_tx, state, None))
+
+    while stack:
+        tx_index, state, step = stack.pop()
+        if step is not None:
+            path_buf[tx_index] = step
+        if tx_index == 0:
+            solutions.add(tuple(path_buf))
+            continue
+        amount_id = amount_ids[tx_index - 1]
+        # The pair chosen for the next equal amount caps the pair of this one
+        next_step = step if step is not None and step[2] == amount_id else None
+        counts = path_counts[tx_index - 1]
+        for prev_state, sender, receiver in layers[tx_index][state]:
+            pair = (sender, receiver)
+            if next_step is not None and pair > next_step[:2]:
+                continue
+            if not any(last is None or last <= pair for last in counts.get(prev_state, ())):
+                continue
+            stack.append((tx_index - 1, prev_state, (sender, receiver, amount_id)))
+
+    return True
+
+def analyze_mixer_privacy(initial_balances, final_balances, tx_amounts, users,
+                          max_candidates=MAX_CANDIDATE_SCENARIOS, max_steps=MAX_SEARCH_STEPS,
+                          max_scenarios=MAX_SCENARIOS):
     """
     Analyzes the mixer's effectiveness by finding all possible transaction mappings
     that could result in the observed balance changes.
+    The analysis is skipped with a warning if there are more than max_candidates candidate scenarios
+    before any search, or if the search would store more than max_steps steps or list more than
+    max_scenarios scenarios.
     """
     print("\n--- Mixer Privacy Analysis ---")
     print("Attempting to deduce who paid whom based on initial/final balances and transaction amounts.")
 
     num_tx = len(tx_amounts)
+    num_users = len(users)
     user_names = [u.name for u in users]
-    
-    # Store solutions as frozensets of tuples to easily find unique scenarios
-    unique_solutions = set()
-
-    # The adversary doesn't know the order of transactions, so we test every permutation of the amounts.
-    # Using set() to get unique permutations in case of duplicate amounts.
-    amount_permutations = list(set(itertools.permutations(tx_amounts)))
-    print(f"Checking {len(amount_permutations)} unique permutation(s) of transaction amounts...")
-
-    def find_solutions_recursive(tx_index, current_balances, path, ordered_amounts):
-        """A recursive function to explore all sender/receiver assignments."""
-        # Base case: if all transactions have been assigned
-        if tx_index == num_tx:
-            # Check if the final state matches the actual final balances
-            if all(abs(current_balances[name] - final_balances[name]) < 1e-9 for name in user_names):
-                # Add the found path as a frozenset to handle transaction order invariance
-                unique_solutions.add(frozenset(path))
+    # Largest amounts first: they pin down the balance changes earliest, so forward checking prunes
+    # sooner, and equal amounts end up next to each other as the solver requires.
+    tx_amounts = sorted(tx_amounts, reverse=True)
+
+    # The adversary doesn't know the order of transactions, but permuting the amounts only changes the
+    # order in which assignments are added to a path, and the canonical key of a path discards that order.
+    # Every permutation would therefore find exactly the same scenarios, so a single pass is enough.
+    print(f"Checking sender/receiver assignments for {num_tx} transaction amount(s)...")
+
+    # Every (sender, receiver) combination of distinct users, built once instead of at every node
+    pairs = [(sender, receiver) for sender in range(num_users) for receiver in range(num_users) if sender != receiver]
+
+    # Solutions are keyed on small ints only, so the leaves never hash floats or strings. Equal amounts
+    # share an id, so scenarios that only swap two equal amounts produce the same key.
+    distinct_amounts = sorted(set(tx_amounts))
+    id_by_amount = {amount: amount_id for amount_id, amount in enumerate(distinct_amounts)}
+    amount_ids = [id_by_amount[amount] for amount in tx_amounts]
+
+    def warn_too_long(reason):
+        print(f"\nWarning: the search is expected to take too long ({reason}).")
+        print("Analysis skipped. Reduce the number of transactions or users, or raise the search limits to run it.")
+
+    # Cheap estimate before any work starts: a run of `count` equal amounts can go to the pairs in
+    # comb(count + len(pairs) - 1, count) distinct ways, since their order does not matter, so the
+    # product over the distinct amounts counts every candidate scenario before pruning.
+    num_candidates = math.prod(math.comb(count + len(pairs) - 1, count) for count in Counter(amount_ids).values())
+    if num_candidates > max_candidates:
+        warn_too_long(f"{num_candidates:.2e} candidate scenarios, more than {max_candidates:.0e}")
+        return
+
+    # Every float is an exact binary fraction, so scaling by the largest denominator among the amounts and
+    # balances turns them all into exact integers. The solver then adds and compares amounts without
+    # any rounding error of its own.
+    values = tx_amounts + [initial_balances[name] for name in user_names] + [final_balances[name] for name in user_names]
+    scale = max(value.as_integer_ratio()[1] for value in values)
+
+    def to_units(value):
+        """Converts a balance or amount into (the floor of) an integer number of 1/scale units."""
+        numerator, denominator = value.as_integer_ratio()
+        return numerator * scale // denominator
+
+    amount_units = [to_units(amount) for amount in tx_amounts]
+
+    # Reformulate the search in terms of each user's net balance change. A scenario is valid when,
+    # for every user, (amounts received) - (amounts sent) equals final - initial balance. Each
+    # assigned amount moves exactly two entries of this vector, one up and one down (a column of
+    # a +/-1 incidence matrix), so the search tracks only the change still left to explain.
+    # The vector is a plain list indexed by user position, so the search never hashes user names.
+    residual_units = [to_units(final_balances[name]) - to_units(initial_balances[name]) for name in user_names]
+
+    # The simulation updated the balances with float arithmetic, so a balance change can be off by a few
+    # float steps of the balance itself; on large balances that exceeds any fixed absolute tolerance.
+    # Each user therefore gets 1e-9 BTC or 1e-12 of their largest balance, whichever is bigger.
+    tolerance_units = [
+        to_units(max(1e-9, 1e-12 * max(abs(initial_balances[name]), abs(final_balances[name]))))
+        for name in user_names
+    ]
+
+    # remaining_sums[i] is the sum of the amounts from position i onwards
+    remaining_sums = [0] * (num_tx + 1)
+    for i in range(num_tx - 1, -1, -1):
+        remaining_sums[i] = remaining_sums[i + 1] + amount_units[i]
+
+    # Store solutions as canonical tuples of (sender, receiver, amount_id) tuples to easily find unique scenarios
+    index_solutions = set()
+    # Money is only moved between users, so the balance changes must cancel out overall
+    if abs(sum(residual_units)) <= sum(tolerance_units):
+        if not find_solutions_tabled(residual_units, amount_units, amount_ids, remaining_sums, pairs,
+                                     index_solutions, tolerance_units, max_steps, max_scenarios):
+            warn_too_long(f"more than {max_steps} search steps or {max_scenarios} scenarios")
             return
 
-        amount = ordered_amounts[tx_index]
-
-        # Iterate through all possible senders and receivers for the current transaction
-        for sender in users:
-            for receiver in users:
-                if sender == receiver:
-                    continue
-
-                # Create a hypothetical new state
-                new_balances = current_balances.copy()
-                new_balances[sender.name] -= amount
-                new_balances[receiver.name] += amount
-
-                # Recurse to the next transaction
-                new_path = path + [(f"{sender.name} -> {receiver.name}", amount)]
-                find_solutions_recursive(tx_index + 1, new_balances, new_path, ordered_amounts)
-
-    # For each permutation of transaction amounts, run the solver
-    for p in amount_permutations:
-        find_solutions_recursive(0, initial_balances.copy(), [], p)
+    # Translate user positions and amount ids back into names and amounts for the report
+    unique_solutions = {
+        frozenset((f"{user_names[sender]} -> {user_names[receiver]}", distinct_amounts[amount_id])
+                  for sender, receiver, amount_id in solution)
+        for solution in index_solutions
+    }
 
     if not unique_solutions:
         print("\nNo possible transaction scenarios found.")
@@ -201,15 +419,22 @@ def analyze_mixer_privacy(initial_balances, final_balances, tx_amounts, users):
         # Ground truth for comparison
         original_txs_set = frozenset([("Alice -> Charlie", 10.0), ("Bob -> David", 5.0), ("David -> Alice", 15.0)])
         
+        # Collect the report lines and write them out in batches of REPORT_BATCH_SCENARIOS scenarios:
+        # far fewer writes than one per line, while the buffer stays small however many scenarios there are
+        report = []
         for i, solution_frozenset in enumerate(unique_solutions):
-            print(f"\n--- Scenario {i + 1} ---")
+            if i and i % REPORT_BATCH_SCENARIOS == 0:
+                sys.stdout.write("\n".join(report) + "\n")
+                report.clear()
+            report.append(f"\n--- Scenario {i + 1} ---")
             # Sort for consistent printing
             solution_list = sorted(list(solution_frozenset), key=lambda x: x[1])
             for transaction, amount in solution_list:
-                print(f"  - A transaction of {amount:.2f} BTC could be: {transaction}")
+                report.append(f"  - A transaction of {amount:.2f} BTC could be: {transaction}")
             
             if solution_frozenset == original_txs_set:
-                print("  (This scenario matches the actual transactions that occurred)")
+                report.append("  (This scenario matches the actual transactions that occurred)")
+        sys.stdout.write("\n".join(report) + "\n")
             
     print("\nAnalysis complete. If multiple scenarios are listed, the adversary cannot be certain which one is correct.")
 
@@ -1,10 +1,22 @@
 import time
 import hashlib
+import itertools
+
+# Bound once at import time; the hashes only derive simulated addresses and IDs, not security material.
+_sha256 = hashlib.sha256
+
+# Numbers every transaction created in this process, so that transaction IDs stay unique even when two
+# transactions share the same addresses, amount and timestamp.
+_transaction_sequence = itertools.count()
 
 class User:
     """Represents a user in the Bitcoin simulation."""
+    __slots__ = ('name', '_name_bytes', 'wallet')
+
     def __init__(self, name):
         self.name = name
+        # Encoded once here so the wallet can derive its address without re-encoding the name
+        self._name_bytes = name.encode()
         self.wallet = Wallet(self)
 
     def __repr__(self):
@@ -12,6 +24,8 @@ class User:
 
 class Wallet:
     """Represents a user's wallet with a public address and balance."""
+    __slots__ = ('owner', 'address', 'balance')
+
     # A helper dictionary to map addresses back to user names for clarity in the simulation.
     # Moved here from Transaction class for better code organization.
     _address_to_name_map = {}
@@ -19,7 +33,7 @@ class Wallet:
     def __init__(self, owner):
         self.owner = owner
         # Generate a simple pseudo-public address from the owner's name
-        self.address = '1x' + hashlib.sha256(owner.name.encode()).hexdigest()[:10]
+        self.address = '1x' + _sha256(owner._name_bytes, usedforsecurity=False).hexdigest()[:10]
         self.balance = 100.0  # Initial balance for simulation purposes
         # Register the wallet automatically upon creation.
         Wallet.register_wallet(self)
@@ -40,18 +54,25 @@ class Wallet:
 
 class Transaction:
     """Represents a single transaction between a sender and a receiver."""
+    __slots__ = ('sender_address', 'receiver_address', 'amount', 'timestamp', 'transaction_id')
+
     def __init__(self, sender_wallet, receiver_wallet, amount):
         if sender_wallet.balance < amount:
             raise ValueError("Insufficient funds for this transaction.")
         self.sender_address = sender_wallet.address
         self.receiver_address = receiver_wallet.address
         self.amount = amount
-        self.timestamp = time.time()
+        # Monotonic integer nanoseconds with no defined starting point, so this is not a wall-clock time.
+        # It never goes backwards, but two transactions can still read the same value; it only feeds the
+        # transaction ID, and an int formats into the hash input more cheaply than a float.
+        self.timestamp = time.perf_counter_ns()
         # Create a unique string based on transaction data BEFORE creating the ID.
         # This resolves the AttributeError caused by a circular dependency where __init__ called __repr__
         # before the transaction_id was created.
-        transaction_data_string = f"{self.sender_address}{self.receiver_address}{self.amount}{self.timestamp}"
-        self.transaction_id = hashlib.sha256(transaction_data_string.encode()).hexdigest()
+        # The sequence number keeps the ID unique when the other fields repeat.
+        transaction_data_string = (f"{self.sender_address}{self.receiver_address}{self.amount}{self.timestamp}"
+                                   f"{next(_transaction_sequence)}")
+        self.transaction_id = _sha256(transaction_data_string.encode(), usedforsecurity=False).hexdigest()
 
         # Update balances immediately upon creation
         sender_wallet.balance -= amount